@@ -2,54 +2,187 @@ import os
 import json
 import re
 import time
+import hashlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
 import fitz  
 import numpy as np
 import torch
 from sentence_transformers import SentenceTransformer
-from sentence_transformers.util import cos_sim
 
 # --- CONFIGURATION ---
 INPUT_JSON_PATH = "input/challenge1b_input.json"
 PDF_DIRECTORY = "input/pdfs"
 OUTPUT_JSON_PATH = "output/challenge1b_output.json"
-MODEL_NAME = SentenceTransformer('./models/all-MiniLM-L6-v2')
+CACHE_DIRECTORY = "cache/pdf_chunks"
+MODEL_NAME = './models/all-MiniLM-L6-v2'
 TOP_K_SECTIONS = 5
+ENCODE_BATCH_CHUNKS = 256
+MULTI_PROCESS_MIN_CHUNKS = 256
+PARAGRAPH_SEPARATOR = '\n\n'
+MIN_PARAGRAPH_LENGTH = 100
 
-def create_paragraph_chunks(doc):
+def available_cpus():
+    """Returns the number of cores this process may run on (respects container CPU sets)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def load_model():
+    """
+    Loads the sentence encoder. On CPU the model runs in fp32; on GPU it
+    runs in fp16.
+    """
+    if torch.cuda.is_available():
+        return SentenceTransformer(MODEL_NAME, device='cuda').half()
+
+    return SentenceTransformer(MODEL_NAME, device='cpu')
+
+def create_paragraph_chunks(pages):
     """
     Creates chunks based on paragraphs. This is a robust fallback when
     structural parsing (heading detection) is unreliable.
+    Returns parallel lists of chunk contents and their page numbers.
+    """
+    contents = []
+    page_nums = []
+    for page_num, page_text in pages:
+        paragraphs = [para for para in (p.strip() for p in page_text.split(PARAGRAPH_SEPARATOR)) if len(para) > MIN_PARAGRAPH_LENGTH]
+        contents.extend(paragraphs)
+        page_nums.extend([page_num] * len(paragraphs))
+    return contents, page_nums
+
+def load_cached(cache_path):
+    """Returns the pickled value at cache_path, or None if it is missing or unreadable."""
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+def store_cached(cache_path, value):
+    """
+    Pickles value to cache_path via a temp file and os.replace, so a killed
+    run never leaves a truncated entry. Write failures are ignored.
     """
-    chunks = []
-    for page_num, page in enumerate(doc, 1):
-        page_text = page.get_text("text")
-        paragraphs = page_text.split('\n\n')
-        for para in paragraphs:
-            cleaned_para = para.strip()
-            if len(cleaned_para) > 100:
-                chunks.append({
-                    "page_num": page_num,
-                    "content": cleaned_para
-                })
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def extract_chunks(file_path):
+    """
+    Extracts paragraph chunks from a PDF. Page texts are streamed into the
+    chunker and dropped as soon as they are split, so only the surviving
+    paragraphs are kept, returned from the worker and cached on disk for
+    reruns. The cache key covers the file (path, mtime, size), the PyMuPDF
+    version and the chunker settings, so changing any of them invalidates
+    old entries.
+    """
+    stat = os.stat(file_path)
+    cache_key = (f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+                 f"|{fitz.VersionBind}|{PARAGRAPH_SEPARATOR!r}|{MIN_PARAGRAPH_LENGTH}")
+    cache_path = os.path.join(CACHE_DIRECTORY, hashlib.sha1(cache_key.encode('utf-8')).hexdigest() + ".pkl")
+    chunks = load_cached(cache_path)
+    if chunks is not None:
+        return chunks
+
+    doc = fitz.open(file_path)
+    try:
+        chunks = create_paragraph_chunks((page_num, page.get_text("text")) for page_num, page in enumerate(doc, 1))
+    finally:
+        doc.close()
+
+    store_cached(cache_path, chunks)
     return chunks
 
-def generate_refined_text(chunk_content, query, model):
-    """Finds the single most relevant sentence in a chunk."""
-    sentences = re.split(r'(?<=[.?!])\s+', chunk_content)
-    sentences = [s.strip() for s in sentences if len(s.strip().split()) > 4]
+def dedupe_chunks(contents, page_nums, doc_name, seen):
+    """
+    Drops chunks whose content hash is already in seen, so repeated
+    boilerplate is encoded once and reported at its first occurrence.
+    Records new hashes in seen and returns the surviving contents, page
+    numbers and document names plus the number of chunks skipped.
+    """
+    unique_contents = []
+    unique_page_nums = []
+    unique_doc_names = []
+    skipped = 0
+    for content, page_num in zip(contents, page_nums):
+        key = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+        if key in seen:
+            skipped += 1
+            continue
+        seen.add(key)
+        unique_contents.append(content)
+        unique_page_nums.append(page_num)
+        unique_doc_names.append(doc_name)
+    return unique_contents, unique_page_nums, unique_doc_names, skipped
+
+def encode_chunks(contents, model, pool=None):
+    """
+    Encodes chunk contents into normalized embeddings, spreading the work
+    over a sentence-transformers multi-process pool when one is given.
+    """
+    if pool is None:
+        return model.encode(contents, batch_size=64, show_progress_bar=True, convert_to_tensor=True, normalize_embeddings=True)
 
-    if not sentences:
-        return chunk_content[:500] 
+    embeddings = model.encode_multi_process(contents, pool, batch_size=32, normalize_embeddings=True)
+    return torch.from_numpy(embeddings)
 
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    sentence_embeddings = model.encode(sentences, convert_to_tensor=True)
+def start_encode_pool(model, cpu_count):
+    """
+    Starts one CPU encode worker per core. Workers are limited to a single
+    OpenMP thread each so the pool does not oversubscribe the cores.
+    """
+    previous = os.environ.get('OMP_NUM_THREADS')
+    os.environ['OMP_NUM_THREADS'] = '1'
+    try:
+        return model.start_multi_process_pool(target_devices=['cpu'] * cpu_count)
+    finally:
+        if previous is None:
+            del os.environ['OMP_NUM_THREADS']
+        else:
+            os.environ['OMP_NUM_THREADS'] = previous
 
-    similarities = cos_sim(query_embedding, sentence_embeddings)
-    best_sentence_index = torch.argmax(similarities)
-    
-    return sentences[best_sentence_index]
+def generate_refined_text_batch(chunk_contents, query_embedding, model):
+    """Finds the single most relevant sentence in each chunk, encoding all sentences in one batch."""
+    chunk_sentences = []
+    all_sents = []
+    offsets = []
+    for chunk_content in chunk_contents:
+        sentences = re.split(r'(?<=[.?!])\s+', chunk_content)
+        sentences = [s.strip() for s in sentences if len(s.strip().split()) > 4]
+        chunk_sentences.append(sentences)
+        offsets.append(len(all_sents))
+        all_sents.extend(sentences)
+    offsets.append(len(all_sents))
+
+    if not all_sents:
+        return [chunk_content[:500] for chunk_content in chunk_contents]
+
+    sent_emb = model.encode(all_sents, batch_size=64, convert_to_tensor=True, show_progress_bar=False, normalize_embeddings=True)
+
+    refined_texts = []
+    for i, chunk_content in enumerate(chunk_contents):
+        start, end = offsets[i], offsets[i + 1]
+        if start == end:
+            refined_texts.append(chunk_content[:500])
+            continue
+
+        similarities = torch.mv(sent_emb[start:end], query_embedding)
+        best_sentence_index = torch.argmax(similarities)
+        refined_texts.append(chunk_sentences[i][best_sentence_index])
+
+    return refined_texts
 
 def main():
     start_time = time.time()
@@ -66,57 +199,99 @@ def main():
     
     print(f"Semantic Query: \"{query}\"\n")
 
-    print("--- Stage 1: Robust Paragraph Chunking ---")
-    all_chunks = []
+    print("--- Stage 1: Robust Paragraph Chunking & Embedding ---")
+    doc_paths = []
     for doc_meta in documents_metadata:
         file_path = os.path.join(PDF_DIRECTORY, doc_meta['filename'])
         if not os.path.exists(file_path):
             continue
-        
-        print(f"Processing: {doc_meta['filename']}")
-        doc = fitz.open(file_path)
-        chunks = create_paragraph_chunks(doc)
-        for chunk in chunks:
-            chunk['doc_name'] = doc_meta['filename']
-        all_chunks.extend(chunks)
-        doc.close()
-    print(f"\nGenerated {len(all_chunks)} paragraph chunks from all documents.\n")
+        doc_paths.append((doc_meta['filename'], file_path))
+
+    contents = []
+    page_nums = []
+    doc_names = []
+    seen = set()
+    duplicates = 0
+    embedding_batches = []
+    encoded = 0
+    cpu_count = available_cpus()
+    max_workers = max(1, min(len(doc_paths), cpu_count))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Workers keep parsing PDFs while this process loads the model and
+        # encodes each batch of chunks as soon as enough have arrived.
+        futures = [executor.submit(extract_chunks, file_path) for _, file_path in doc_paths]
+        model = load_model()
+        for (doc_name, _), future in zip(doc_paths, futures):
+            doc_contents, doc_page_nums = future.result()
+            print(f"Processing: {doc_name}")
+            unique_contents, unique_page_nums, unique_doc_names, skipped = dedupe_chunks(doc_contents, doc_page_nums, doc_name, seen)
+            contents.extend(unique_contents)
+            page_nums.extend(unique_page_nums)
+            doc_names.extend(unique_doc_names)
+            duplicates += skipped
 
-    if not all_chunks:
+            # Only overlap while extraction is still running; once it is done
+            # the remainder is left for the multi-process pool below.
+            busy_workers = min(max_workers, sum(not f.done() for f in futures))
+            if busy_workers and len(contents) - encoded > ENCODE_BATCH_CHUNKS:
+                # Leave the cores still parsing to the extraction workers.
+                torch.set_num_threads(max(1, cpu_count - busy_workers))
+                embedding_batches.append(encode_chunks(contents[encoded:], model))
+                encoded = len(contents)
+
+    # Extraction workers have exited, so in-process encoding and a large
+    # remainder's multi-process pool may use every core without oversubscribing.
+    torch.set_num_threads(cpu_count)
+    remaining = contents[encoded:]
+    if len(remaining) > MULTI_PROCESS_MIN_CHUNKS and cpu_count > 1 and not torch.cuda.is_available():
+        pool = start_encode_pool(model, cpu_count)
+        try:
+            embedding_batches.append(encode_chunks(remaining, model, pool))
+        finally:
+            model.stop_multi_process_pool(pool)
+    elif remaining:
+        embedding_batches.append(encode_chunks(remaining, model))
+    pages = np.asarray(page_nums, dtype=np.int32)
+    doc_names = np.asarray(doc_names, dtype=object)
+    print(f"\nGenerated {len(contents)} paragraph chunks from all documents ({duplicates} duplicates skipped).\n")
+
+    if not contents:
         print("❌ No content chunks were generated. Exiting.")
         return
 
     print("--- Stage 2: Semantic Search & Analysis ---")
-    model = MODEL_NAME
-    chunk_embeddings = model.encode([chunk['content'] for chunk in all_chunks], show_progress_bar=True, convert_to_tensor=True)
-    query_embedding = model.encode(query, convert_to_tensor=True)
+    chunk_embeddings = torch.cat(embedding_batches)
+    query_embedding = model.encode(query, convert_to_tensor=True, normalize_embeddings=True)
 
-    similarities = cos_sim(query_embedding, chunk_embeddings)[0]
-    top_k_indices = torch.topk(similarities, k=min(TOP_K_SECTIONS, len(all_chunks))).indices
+    # Embeddings are unit length, so the inner product is the cosine similarity.
+    similarities = torch.mv(chunk_embeddings, query_embedding)
+    top_k_indices = torch.topk(similarities, k=min(TOP_K_SECTIONS, len(contents))).indices.cpu().numpy()
 
     print("Generating final output...")
     extracted_sections = []
     subsection_analysis = []
     
-    for i, idx in enumerate(top_k_indices):
-        chunk = all_chunks[idx]
-        
-        section_title = chunk['content'].replace('\n', ' ').strip()
+    top_contents = [contents[idx] for idx in top_k_indices]
+    top_pages = pages[top_k_indices]
+    top_docs = doc_names[top_k_indices]
+    refined_texts = generate_refined_text_batch(top_contents, query_embedding, model)
+
+    for i, (content, doc_name, page_num, refined_text) in enumerate(zip(top_contents, top_docs, top_pages, refined_texts)):
+        section_title = content.replace('\n', ' ').strip()
         if len(section_title) > 75:
             section_title = section_title[:75] + "..."
 
         extracted_sections.append({
-            "document": chunk['doc_name'],
+            "document": doc_name,
             "section_title": section_title,
             "importance_rank": i + 1,
-            "page_number": chunk['page_num']
+            "page_number": int(page_num)
         })
-        
-        refined_text = generate_refined_text(chunk['content'], query, model)
+
         subsection_analysis.append({
-            "document": chunk['doc_name'],
+            "document": doc_name,
             "refined_text": refined_text,
-            "page_number": chunk['page_num']
+            "page_number": int(page_num)
         })
     
     final_output = {
@@ -0,0 +1,137 @@
+import os
+
+import pytest
+import torch
+
+import app
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PDF = os.path.join(REPO_ROOT, "input", "pdfs", "South of France - Cuisine.pdf")
+
+
+@pytest.fixture(scope="module")
+def model():
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(app, "MODEL_NAME", os.path.join(REPO_ROOT, "models", "all-MiniLM-L6-v2"))
+        yield app.load_model()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(app, "CACHE_DIRECTORY", str(cache_dir))
+    return cache_dir
+
+
+def test_extract_chunks_cache_hit_matches_fresh_extraction(cache_dir, monkeypatch):
+    fresh = app.extract_chunks(SAMPLE_PDF)
+    assert fresh[0]
+
+    def fail_open(*args, **kwargs):
+        raise AssertionError("cache hit should not reopen the PDF")
+
+    monkeypatch.setattr(app.fitz, "open", fail_open)
+    assert app.extract_chunks(SAMPLE_PDF) == fresh
+
+
+def test_extract_chunks_rewrites_truncated_cache_entry(cache_dir):
+    fresh = app.extract_chunks(SAMPLE_PDF)
+    (cache_path,) = cache_dir.iterdir()
+    cache_path.write_bytes(cache_path.read_bytes()[:10])
+
+    assert app.extract_chunks(SAMPLE_PDF) == fresh
+    assert app.load_cached(str(cache_path)) == fresh
+    assert [p.name for p in cache_dir.iterdir()] == [cache_path.name]
+
+
+def test_extract_chunks_survives_unwritable_cache_directory(tmp_path, monkeypatch):
+    blocker = tmp_path / "not_a_directory"
+    blocker.write_text("")
+    monkeypatch.setattr(app, "CACHE_DIRECTORY", str(blocker / "cache"))
+
+    contents, page_nums = app.extract_chunks(SAMPLE_PDF)
+
+    assert contents and len(contents) == len(page_nums)
+    assert [p.name for p in tmp_path.iterdir()] == ["not_a_directory"]
+
+
+def test_extract_chunks_cache_misses_when_chunker_settings_change(cache_dir, monkeypatch):
+    default = app.extract_chunks(SAMPLE_PDF)
+    monkeypatch.setattr(app, "MIN_PARAGRAPH_LENGTH", 100000)
+
+    assert app.extract_chunks(SAMPLE_PDF) == ([], [])
+    assert len(list(cache_dir.iterdir())) == 2
+
+    monkeypatch.setattr(app, "MIN_PARAGRAPH_LENGTH", 100)
+    assert app.extract_chunks(SAMPLE_PDF) == default
+
+
+def test_extract_chunks_cache_misses_when_pymupdf_version_changes(cache_dir, monkeypatch):
+    app.extract_chunks(SAMPLE_PDF)
+    monkeypatch.setattr(app.fitz, "VersionBind", "0.0.0")
+
+    app.extract_chunks(SAMPLE_PDF)
+
+    assert len(list(cache_dir.iterdir())) == 2
+
+
+def test_dedupe_chunks_keeps_first_occurrence_across_documents():
+    footer = "This guide is provided for informational purposes only and prices may change without notice at any time."
+    seen = set()
+
+    contents, page_nums, doc_names, skipped = [], [], [], 0
+    for doc_name, doc_contents, doc_page_nums in [
+        ("Cities.pdf", ["Cities intro", footer], [1, 4]),
+        ("Cuisine.pdf", [footer, "Cuisine intro", footer], [2, 3, 9]),
+    ]:
+        unique = app.dedupe_chunks(doc_contents, doc_page_nums, doc_name, seen)
+        contents.extend(unique[0])
+        page_nums.extend(unique[1])
+        doc_names.extend(unique[2])
+        skipped += unique[3]
+
+    assert contents == ["Cities intro", footer, "Cuisine intro"]
+    assert page_nums == [1, 4, 3]
+    assert doc_names == ["Cities.pdf", "Cities.pdf", "Cuisine.pdf"]
+    assert skipped == 2
+
+
+def test_encode_pool_matches_in_process_encoding(model):
+    contents = [f"Paragraph {i} describes a day trip along the coast of the South of France." for i in range(40)]
+
+    pool = app.start_encode_pool(model, 2)
+    try:
+        pooled = app.encode_chunks(contents, model, pool)
+    finally:
+        model.stop_multi_process_pool(pool)
+    in_process = app.encode_chunks(contents, model).cpu()
+
+    assert pooled.shape == (40, 384)
+    assert torch.allclose(pooled, in_process.to(pooled.dtype), atol=1e-4)
+
+
+def test_encoding_is_independent_of_batch_boundaries(model):
+    contents = [f"Chunk {i}: " + "the old town of Nice has markets, museums and beaches. " * (1 + i % 5) for i in range(30)]
+
+    whole = app.encode_chunks(contents, model)
+    split = torch.cat([app.encode_chunks(contents[:7], model), app.encode_chunks(contents[7:], model)])
+
+    assert torch.allclose(whole, split, atol=1e-5)
+
+
+def test_refined_text_falls_back_per_chunk_and_picks_best_sentences(model):
+    short_fragments = "Nice. Cannes. Go now. " * 40
+    beach_chunk = ("The tax office closes early on Fridays in winter. "
+                   "The sandy beaches near Antibes are perfect for swimming in summer.")
+    food_chunk = ("Bouillabaisse is a traditional fish stew from the port of Marseille. "
+                  "Parking permits must be renewed at the town hall every year.")
+    query_embedding = model.encode("Where can I go swimming at the beach or eat fish stew?",
+                                   convert_to_tensor=True, normalize_embeddings=True)
+
+    refined = app.generate_refined_text_batch([short_fragments, beach_chunk, food_chunk], query_embedding, model)
+
+    assert refined == [
+        short_fragments[:500],
+        "The sandy beaches near Antibes are perfect for swimming in summer.",
+        "Bouillabaisse is a traditional fish stew from the port of Marseille.",
+    ]